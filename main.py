@@ -1,17 +1,28 @@
 import os
+import tempfile
+import hashlib
+import math
 import time
-import json
+import orjson
 import asyncio
 import httpx
+import diskcache
+from cachetools import TTLCache
+from collections import Counter
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any, Optional, Tuple
 
 from fastapi import FastAPI, Query, Request
 from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-import pandas as pd
-import requests
+from lxml import etree
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+import xlsxwriter
 
 # Load environment
 load_dotenv()
@@ -19,7 +30,22 @@ API_KEY = os.getenv("GOOGLE_API_KEY")
 if not API_KEY:
     raise RuntimeError("Define GOOGLE_API_KEY en .env")
 
-app = FastAPI(title="Elevator Distributor Finder", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP/2 client for the whole app: keep-alive across Google calls and scrapes
+    app.state.client = httpx.AsyncClient(
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+    try:
+        yield
+    finally:
+        await app.state.client.aclose()
+
+
+app = FastAPI(title="Elevator Distributor Finder", version="1.0.0", lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 
 # Static curated synonyms for performance
@@ -39,124 +65,457 @@ QUERY_SYNONYMS = [
     "ascensore", "ascensori",
     "elevador", "elevadores",
 ]
+# Phrases overlap heavily with the single-word stems in Places results
+QUERY_PHRASES = [q for q in QUERY_SYNONYMS if " " in q]
+QUERY_STEMS = [q for q in QUERY_SYNONYMS if " " not in q]
+# Below this many providers from the phrase pass, also search the stems
+MIN_PROVIDERS = 20
+# At most this many places go on to Details + scraping
+MAX_CANDIDATES = 200
 
-# Simple in-memory cache: area → (timestamp, results)
+# In-memory TTL+LRU cache: canonical place_id (or area) → results index (see build_index)
 CACHE_TTL = 3600  # 1 hour
-cache_store: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+cache_store: TTLCache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
+# Free-text area → canonical place, or None when Places has no match (see resolve_area)
+area_cache: TTLCache = TTLCache(maxsize=4096, ttl=CACHE_TTL * 24)
+_UNRESOLVED = object()
+# Largest Text Search location bias radius (Places API maximum)
+MAX_SEARCH_RADIUS = 50000
+# Searches currently running, keyed like cache_store
+_inflight: Dict[str, asyncio.Task] = {}
+# On-disk cache of scraped site details: blake2b(url) → {info, etag, lm, ts}
+SITE_CACHE_TTL = 86400 * 7  # 1 week kept on disk
+SITE_FRESH_TTL = 86400  # 1 day served without revalidation
+# Pages larger than this (per HEAD Content-Length) are not scraped
+MAX_PAGE_BYTES = 2_000_000
+site_cache = diskcache.Cache("./cache/sites")
+
+
+# Concurrent Text Search terms in flight
+SEARCH_CONCURRENCY = 8
+# Place Details calls / site scrapes in flight
+DETAILS_CONCURRENCY = 10
+SCRAPE_CONCURRENCY = 32
 
 
 def normalize(text: str) -> str:
     return " ".join(text.strip().lower().split())
 
 
-def scrape_site_details(url: str) -> Dict[str, Any]:
+def _read_jsonld(raw: Optional[str], info: Dict[str, Any]) -> None:
+    # Only brand and foundingDate are used: skip parsing blocks without either key
+    if not raw or ('"brand"' not in raw and '"foundingDate"' not in raw):
+        return
+    try:
+        data = orjson.loads(raw.encode())
+        if isinstance(data, dict):
+            brand = data.get("brand")
+            items = []
+            if isinstance(brand, list):
+                items = brand
+            elif isinstance(brand, dict) and "name" in brand:
+                items = [brand["name"]]
+            elif isinstance(brand, str):
+                items = [brand]
+            info["brands"].extend(items)
+            if data.get("@type") == "Organization" and data.get("foundingDate"):
+                info["founding_date"] = data["foundingDate"]
+    except:
+        pass
+
+
+def _extract_lexbor(resp: httpx.Response, info: Dict[str, Any]) -> None:
+    tree = LexborHTMLParser(resp.text)
+    # JSON-LD brands and founding
+    for script in tree.css('script[type="application/ld+json"]'):
+        _read_jsonld(script.text(), info)
+    # Email & LinkedIn
+    m = tree.css_first('a[href^="mailto:"]')
+    if m and m.attributes.get("href"):
+        info["email"] = m.attributes["href"].split("mailto:")[1].split("?")[0]
+    l = tree.css_first('a[href*="linkedin.com/company"]')
+    if l:
+        info["linkedin"] = l.attributes.get("href")
+    # Lists under headers
+    for header in tree.css("h2,h3,h4"):
+        title = header.text(strip=True).lower()
+        ul = header.next
+        while ul is not None and ul.tag != "ul":
+            ul = ul.next
+        if ul is not None:
+            items = [li.text(strip=True) for li in ul.css("li")]
+            if "marca" in title:
+                info["brands"].extend(items)
+            if "certific" in title:
+                info["certifications"].extend(items)
+
+
+# Precompiled XPath for the lxml fallback
+X_JSONLD = etree.XPath('//script[@type="application/ld+json"]')
+X_MAILTO = etree.XPath('(//a[starts-with(@href, "mailto:")])[1]/@href')
+X_LINKEDIN = etree.XPath('(//a[contains(@href, "linkedin.com/company")])[1]/@href')
+X_HEADERS = etree.XPath("//h2|//h3|//h4")
+X_NEXT_UL = etree.XPath("following-sibling::ul[1]")
+X_LI = etree.XPath(".//li")
+
+
+def _text(el) -> str:
+    return "".join(s.strip() for s in el.itertext())
+
+
+def _extract_lxml(resp: httpx.Response, info: Dict[str, Any]) -> None:
+    root = etree.HTML(resp.content)
+    if root is None:
+        return
+    # JSON-LD brands and founding
+    for script in X_JSONLD(root):
+        _read_jsonld(script.text, info)
+    # Email & LinkedIn
+    m = X_MAILTO(root)
+    if m:
+        info["email"] = m[0].split("mailto:")[1].split("?")[0]
+    l = X_LINKEDIN(root)
+    if l:
+        info["linkedin"] = l[0]
+    # Lists under headers
+    for header in X_HEADERS(root):
+        title = _text(header).lower()
+        ul = X_NEXT_UL(header)
+        if ul:
+            items = [_text(li) for li in X_LI(ul[0])]
+            if "marca" in title:
+                info["brands"].extend(items)
+            if "certific" in title:
+                info["certifications"].extend(items)
+
+
+# selectolax (lexbor) when available, lxml otherwise
+extract_html = _extract_lexbor if LexborHTMLParser else _extract_lxml
+
+
+def _site_key(url: str) -> str:
+    return hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+
+
+async def scrape_site_details(client: httpx.AsyncClient, url: str) -> Dict[str, Any]:
+    key = _site_key(url)
+    # diskcache is blocking SQLite; keep it off the event loop
+    entry = await asyncio.to_thread(site_cache.get, key)
+    if entry is not None and time.time() - entry["ts"] < SITE_FRESH_TTL:
+        return entry["info"]
+    headers = {"User-Agent": "Mozilla/5.0", "Accept-Encoding": "br, gzip"}
+    # Stale entry: revalidate instead of re-downloading
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["lm"]:
+            headers["If-Modified-Since"] = entry["lm"]
+    try:
+        if entry is None and not await _looks_like_html(client, url):
+            return _parse_site(None)
+        resp = await client.get(url, headers=headers, timeout=10, follow_redirects=True)
+        not_modified = resp.status_code == 304 and entry is not None
+        if not not_modified:
+            resp.raise_for_status()
+    except (httpx.HTTPError, httpx.InvalidURL):
+        return entry["info"] if entry is not None else _parse_site(None)
+    info = entry["info"] if not_modified else _parse_site(resp)
+    # Only successful scrapes get a company type; failures are retried next time
+    if info["company_type"]:
+        await asyncio.to_thread(site_cache.set, key, {
+            "info": info,
+            "etag": resp.headers.get("etag") or (entry["etag"] if not_modified else None),
+            "lm": resp.headers.get("last-modified") or (entry["lm"] if not_modified else None),
+            "ts": time.time(),
+        }, expire=SITE_CACHE_TTL)
+    return info
+
+
+async def _looks_like_html(client: httpx.AsyncClient, url: str) -> bool:
+    # HEAD first so PDFs, app-store redirects and huge pages are never downloaded
+    try:
+        head = await client.head(
+            url, headers={"User-Agent": "Mozilla/5.0"}, timeout=5, follow_redirects=True
+        )
+    except httpx.HTTPError:
+        # Timeouts/resets on HEAD alone shouldn't block the GET
+        return True
+    if head.is_error:
+        # Some servers reject HEAD; let the GET decide
+        return True
+    ctype = head.headers.get("content-type")
+    if ctype and "text/html" not in ctype:
+        return False
+    length = head.headers.get("content-length", "0")
+    return not (length.isdigit() and int(length) > MAX_PAGE_BYTES)
+
+
+def _parse_site(resp: Optional[httpx.Response]) -> Dict[str, Any]:
     info = {"email": None, "linkedin": None, "brands": [], "certifications": [], "company_type": None}
+    if resp is None:
+        return info
     try:
-        resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        # JSON-LD brands and founding
-        for script in soup.select('script[type="application/ld+json"]'):
-            try:
-                data = json.loads(script.string or "{}")
-                if isinstance(data, dict):
-                    brand = data.get("brand")
-                    items = []
-                    if isinstance(brand, list):
-                        items = brand
-                    elif isinstance(brand, dict) and "name" in brand:
-                        items = [brand["name"]]
-                    elif isinstance(brand, str):
-                        items = [brand]
-                    info["brands"].extend(items)
-                    if data.get("@type") == "Organization" and data.get("foundingDate"):
-                        info["founding_date"] = data["foundingDate"]
-            except:
-                pass
-        # Email & LinkedIn
-        m = soup.select_one('a[href^="mailto:"]')
-        if m:
-            info["email"] = m["href"].split("mailto:")[1].split("?")[0]
-        l = soup.select_one('a[href*="linkedin.com/company"]')
-        if l:
-            info["linkedin"] = l["href"]
-        # Lists under headers
-        for header in soup.find_all(["h2", "h3", "h4"]):
-            title = header.get_text(strip=True).lower()
-            ul = header.find_next_sibling("ul")
-            if ul:
-                items = [li.get_text(strip=True) for li in ul.find_all("li")]
-                if "marca" in title:
-                    info["brands"].extend(items)
-                if "certific" in title:
-                    info["certifications"].extend(items)
-        # Company type heuristic
-        text = soup.get_text(separator=" ").lower()
-        if "fabricante" in text:
+        extract_html(resp, info)
+        # Company type heuristic on the raw bytes, no DOM text copy
+        raw = resp.content.lower()
+        if raw.find(b"fabricante") != -1:
             info["company_type"] = "Fabricante + Distribuidor"
-        elif "constructora" in text:
+        elif raw.find(b"constructora") != -1:
             info["company_type"] = "Constructora con instalación"
         else:
             info["company_type"] = "Distribuidor puro"
     except:
         pass
     # Deduplicate
-    info["brands"] = list(dict.fromkeys([b for b in info["brands"] if isinstance(b, str)]))
-    info["certifications"] = list(dict.fromkeys([c for c in info["certifications"] if isinstance(c, str)]))
+    info["brands"] = _unique_str(info["brands"])
+    info["certifications"] = _unique_str(info["certifications"])
     return info
 
 
-async def get_elevator_distributors(area: str) -> List[Dict[str, Any]]:
-    now = time.monotonic()
+def _unique_str(items: List[Any]) -> List[str]:
+    # Single pass: keep first occurrence of each string, drop non-strings
+    seen = set()
+    out = []
+    for x in items:
+        if isinstance(x, str) and x not in seen:
+            seen.add(x)
+            out.append(x)
+    return out
+
+
+async def _with_sem(sem: asyncio.Semaphore, coro):
+    async with sem:
+        return await coro
+
+
+async def resolve_area(area: str, client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """Canonical place for a free-text area (FindPlaceFromText), or None if not found."""
+    cached = area_cache.get(area, _UNRESOLVED)
+    if cached is not _UNRESOLVED:
+        return cached
+    try:
+        resp = await client.get(
+            "https://maps.googleapis.com/maps/api/place/findplacefromtext/json",
+            params={
+                "input": area, "inputtype": "textquery", "language": "es", "key": API_KEY,
+                "fields": "place_id,geometry",
+            }
+        )
+        resp.raise_for_status()
+        page = orjson.loads(resp.content)
+    except (httpx.HTTPError, orjson.JSONDecodeError):
+        # Search under the area text; canonicalisation is retried next request
+        return None
+    status = page.get("status")
+    if status == "ZERO_RESULTS":
+        area_cache[area] = None
+        return None
+    candidates = page.get("candidates", [])
+    # OVER_QUERY_LIMIT, REQUEST_DENIED, ...: don't cache, retry next request
+    if status != "OK" or not candidates or not candidates[0].get("place_id"):
+        return None
+    c = candidates[0]
+    place = {"place_id": c["place_id"]}
+    geometry = c.get("geometry", {})
+    loc = geometry.get("location")
+    ne = geometry.get("viewport", {}).get("northeast")
+    # Only bias when the whole viewport fits; a capped radius would skew wide areas
+    # towards their centre
+    radius = int(_distance_m(loc, ne)) if loc and ne else None
+    if radius is not None and radius <= MAX_SEARCH_RADIUS:
+        place["location"] = f"{loc['lat']},{loc['lng']}"
+        place["radius"] = radius
+    area_cache[area] = place
+    return place
+
+
+def _distance_m(a: Dict[str, float], b: Dict[str, float]) -> float:
+    # Haversine distance in metres between two {"lat", "lng"} points
+    lat1, lat2 = math.radians(a["lat"]), math.radians(b["lat"])
+    dlat, dlng = lat2 - lat1, math.radians(b["lng"] - a["lng"])
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+async def get_elevator_distributors(area: str, client: httpx.AsyncClient) -> Dict[str, Any]:
+    # Key on the canonical place so "madrid" / "madrid, spain" share an entry
+    place = await resolve_area(area, client)
+    key = place["place_id"] if place else area
     # Serve from cache
-    if area in cache_store:
-        ts, data = cache_store[area]
-        if now - ts < CACHE_TTL:
-            return data
-    seen_ids = set()
-    prelim: List[Tuple[str, str, str]] = []
-
-    async with httpx.AsyncClient(timeout=10) as client:
-        # Text Search sequential due to pagination
-        for base in QUERY_SYNONYMS:
-            token: Optional[str] = None
-            while True:
-                params = {"query": f"{base} en {area}", "key": API_KEY, "language": "es"}
-                if token:
-                    params["pagetoken"] = token
-                    await asyncio.sleep(2)
+    cached = cache_store.get(key)
+    if cached is not None:
+        return cached
+    # Single-flight: concurrent misses for the same area share one search
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_search_distributors(key, area, place, client))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _search_done(key, t))
+    return await asyncio.shield(task)
+
+
+def _search_done(key: str, task: asyncio.Task) -> None:
+    _inflight.pop(key, None)
+    # Retrieve the exception so it isn't logged as never retrieved when every waiter
+    # was cancelled; waiters still awaiting the shield get it re-raised
+    if not task.cancelled():
+        task.exception()
+
+
+async def _search_distributors(
+    key: str, area: str, place: Optional[Dict[str, Any]], client: httpx.AsyncClient
+) -> Dict[str, Any]:
+    # place_id → (name, address) in first-seen order, and how many terms surfaced it
+    places: Dict[str, Tuple[str, str]] = {}
+    hits: Counter = Counter()
+
+    # Text Search: one task per term, pagination sequential inside each
+    async def paginate(base: str) -> List[Tuple[str, str, str]]:
+        found: List[Tuple[str, str, str]] = []
+        token: Optional[str] = None
+        while True:
+            params = {"query": f"{base} en {area}", "key": API_KEY, "language": "es"}
+            if place and "location" in place:
+                params["location"] = place["location"]
+                params["radius"] = place["radius"]
+            if token:
+                params["pagetoken"] = token
+                await asyncio.sleep(2)
+            try:
                 resp = await client.get(
                     "https://maps.googleapis.com/maps/api/place/textsearch/json", params=params
                 )
                 resp.raise_for_status()
-                page = resp.json()
-                for p in page.get("results", []):
-                    pid = p.get("place_id")
-                    if pid and pid not in seen_ids:
-                        seen_ids.add(pid)
-                        prelim.append((pid, p.get("name"), p.get("formatted_address")))
-                token = page.get("next_page_token")
-                if not token:
-                    break
-        # Fetch details + scrape in parallel
-        async def fetch(pid: str, name: str, addr: str) -> Dict[str, Any]:
-            r = await client.get(
-                "https://maps.googleapis.com/maps/api/place/details/json",
-                params={"place_id": pid, "fields": "formatted_phone_number,website", "key": API_KEY}
-            )
-            r.raise_for_status()
-            detail = r.json().get("result", {})
-            phone = detail.get("formatted_phone_number")
-            website = detail.get("website")
-            extras = await asyncio.to_thread(scrape_site_details, website) if website else {}
-            return {"company": name, "address": addr, "phone": phone, "website": website, **extras}
-
-        tasks = [fetch(pid, nm, ad) for pid, nm, ad in prelim]
-        results = await asyncio.gather(*tasks)
+                page = orjson.loads(resp.content)
+            except (httpx.HTTPError, orjson.JSONDecodeError):
+                # Keep whatever earlier pages returned for this term
+                return found
+            for p in page.get("results", []):
+                if p.get("place_id"):
+                    found.append((p["place_id"], p.get("name"), p.get("formatted_address")))
+            token = page.get("next_page_token")
+            if not token:
+                return found
+
+    search_sem = asyncio.Semaphore(SEARCH_CONCURRENCY)
+
+    async def search(terms: List[str]) -> None:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(_with_sem(search_sem, paginate(b))) for b in terms]
+        for task in tasks:
+            found = task.result()
+            for pid, nm, ad in found:
+                places.setdefault(pid, (nm, ad))
+            hits.update({pid for pid, _, _ in found})
+
+    # Phrase queries first; single-word stems only when they find too few
+    await search(QUERY_PHRASES)
+    if len(places) < MIN_PROVIDERS:
+        await search(QUERY_STEMS)
+    # Places surfaced by more terms are stronger matches; cap the Details/scrape fan-out
+    ranked = sorted(places, key=lambda pid: hits[pid], reverse=True)[:MAX_CANDIDATES]
+    prelim = [(pid, *places[pid]) for pid in ranked]
+
+    # Place Details, capped to stay under Google's QPS limit
+    async def get_details(pid: str) -> Dict[str, Any]:
+        r = await client.get(
+            "https://maps.googleapis.com/maps/api/place/details/json",
+            params={"place_id": pid, "fields": "formatted_phone_number,website", "key": API_KEY}
+        )
+        r.raise_for_status()
+        return orjson.loads(r.content).get("result", {})
+
+    details_sem = asyncio.Semaphore(DETAILS_CONCURRENCY)
+    details = await asyncio.gather(*[_with_sem(details_sem, get_details(pid)) for pid, _, _ in prelim])
+    results = [
+        {"company": nm, "address": ad, "phone": d.get("formatted_phone_number"), "website": d.get("website")}
+        for (_, nm, ad), d in zip(prelim, details)
+    ]
+
+    # Scrape only entries that have a website
+    scrape_sem = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+    with_site = [r for r in results if r["website"]]
+    extras = await asyncio.gather(
+        *[_with_sem(scrape_sem, scrape_site_details(client, r["website"])) for r in with_site]
+    )
+    for r, ex in zip(with_site, extras):
+        r.update(ex)
 
     # Cache and return
-    cache_store[area] = (now, results)
-    return results
+    index = build_index(results)
+    cache_store[key] = index
+    return index
+
+
+def build_index(provs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Filter options and value → provider positions, built once per cached area."""
+    by_brand: Dict[str, set] = {}
+    by_type: Dict[str, set] = {}
+    by_cert: Dict[str, set] = {}
+    for i, p in enumerate(provs):
+        for b in p.get("brands", []):
+            by_brand.setdefault(b, set()).add(i)
+        if p.get("company_type"):
+            by_type.setdefault(p["company_type"], set()).add(i)
+        for c in p.get("certifications", []):
+            by_cert.setdefault(c, set()).add(i)
+    return {
+        "providers": provs,
+        "all_brands": sorted(by_brand),
+        "all_types": sorted(by_type),
+        "all_certs": sorted(by_cert),
+        "by_brand": by_brand,
+        "by_type": by_type,
+        "by_cert": by_cert,
+    }
+
+
+def filter_providers(
+    index: Dict[str, Any],
+    brand: Optional[str],
+    company_type: Optional[str],
+    certification: Optional[str]
+) -> List[Dict[str, Any]]:
+    provs = index["providers"]
+    selected = [
+        index[key].get(value, set())
+        for key, value in (("by_brand", brand), ("by_type", company_type), ("by_cert", certification))
+        if value
+    ]
+    if not selected:
+        return provs
+    return [provs[i] for i in sorted(set.intersection(*selected))]
+
+
+# Excel export columns: provider key → header
+EXPORT_COLUMNS = [
+    ("company", "Empresa"), ("address", "Dirección"), ("phone", "Teléfono"),
+    ("website", "Website"), ("email", "Email"), ("linkedin", "LinkedIn"),
+    ("brands", "Marcas"), ("certifications", "Certificaciones"),
+    ("company_type", "TipoEmpresa"), ("founding_date", "founding_date"),
+]
+
+
+def _cell(value: Any) -> Any:
+    # Scraped JSON-LD can hold dicts/lists; xlsxwriter only takes scalars
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, list):
+        return ", ".join(map(str, value))
+    return str(value)
+
+
+def write_excel(path: str, provs: List[Dict[str, Any]]) -> None:
+    # constant_memory flushes each row to disk once written
+    # Plain strings like pandas wrote: no URL cells (2079-char limit), no formulas
+    wb = xlsxwriter.Workbook(
+        path, {"constant_memory": True, "strings_to_urls": False, "strings_to_formulas": False}
+    )
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, [header for _, header in EXPORT_COLUMNS])
+    for i, p in enumerate(provs, start=1):
+        ws.write_row(i, 0, [_cell(p.get(key)) for key, _ in EXPORT_COLUMNS])
+    wb.close()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -173,23 +532,15 @@ async def results(
     certification: Optional[str] = Query(None)
 ) -> HTMLResponse:
     a = normalize(area)
-    provs = await get_elevator_distributors(a)
-    all_brands = sorted({b for p in provs for b in p.get("brands", [])})
-    all_types = sorted({p.get("company_type") for p in provs})
-    all_certs = sorted({c for p in provs for c in p.get("certifications", [])})
-    filtered = [
-        p for p in provs
-        if (not brand or brand in p.get("brands", []))
-        and (not company_type or p.get("company_type") == company_type)
-        and (not certification or certification in p.get("certifications", []))
-    ]
+    index = await get_elevator_distributors(a, request.app.state.client)
+    filtered = filter_providers(index, brand, company_type, certification)
     return templates.TemplateResponse("index.html", {
         "request": request,
         "results": filtered,
         "area": a,
-        "all_brands": all_brands,
-        "all_types": all_types,
-        "all_certs": all_certs,
+        "all_brands": index["all_brands"],
+        "all_types": index["all_types"],
+        "all_certs": index["all_certs"],
         "selected_brand": brand or "",
         "selected_type": company_type or "",
         "selected_cert": certification or ""
@@ -198,42 +549,40 @@ async def results(
 
 @app.get("/export")
 async def export(
+    request: Request,
     area: str = Query(...),
     brand: Optional[str] = Query(None),
     company_type: Optional[str] = Query(None),
     certification: Optional[str] = Query(None)
 ) -> FileResponse:
     a = normalize(area)
-    provs = await get_elevator_distributors(a)
-    filtered = [
-        p for p in provs
-        if (not brand or brand in p.get("brands", []))
-        and (not company_type or p.get("company_type") == company_type)
-        and (not certification or certification in p.get("certifications", []))
-    ]
-    df = pd.DataFrame(filtered)
-    df.rename(columns={
-        "company": "Empresa", "address": "Dirección", "brands": "Marcas",
-        "certifications": "Certificaciones", "company_type": "TipoEmpresa",
-        "email": "Email", "phone": "Teléfono", "linkedin": "LinkedIn",
-        "website": "Website"
-    }, inplace=True)
+    index = await get_elevator_distributors(a, request.app.state.client)
+    filtered = filter_providers(index, brand, company_type, certification)
     fname = f"distribuidores_{a}.xlsx".replace(" ", "_")
-    df.to_excel(fname, index=False)
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+        path = tmp.name
+    try:
+        await asyncio.to_thread(write_excel, path, filtered)
+    except:
+        os.remove(path)
+        raise
     return FileResponse(
-        fname,
+        path,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=fname
+        filename=fname,
+        background=BackgroundTask(os.remove, path)
     )
 
 
 # JSON endpoint for Swagger
 @app.get("/api/results", summary="Buscar distribuidores (JSON)")
 async def api_results(
+    request: Request,
     area: str = Query(..., description="Ciudad, región o país")
 ) -> List[Dict[str, Any]]:
     """
     Devuelve JSON puro de distribuidores para integraciones.
     """
     a = normalize(area)
-    return await get_elevator_distributors(a)
+    index = await get_elevator_distributors(a, request.app.state.client)
+    return index["providers"]
@@ -0,0 +1,28 @@
+"""Regenera synonyms.json traduciendo BASE_SYNONYMS a TARGET_LANGS.
+
+Uso: python scripts/build_synonyms.py
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from synonyms import BASE_SYNONYMS, SYNONYMS_FILE, TARGET_LANGS, build_query_synonyms  # noqa: E402
+
+
+def main() -> None:
+    syns = build_query_synonyms(BASE_SYNONYMS, TARGET_LANGS)
+    # build_query_synonyms ignora los idiomas que fallan: sin traducciones no se escribe nada
+    if len(syns) <= len(BASE_SYNONYMS):
+        sys.exit("No se obtuvo ninguna traducción; synonyms.json no se ha modificado")
+    tmp = SYNONYMS_FILE.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(syns, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, SYNONYMS_FILE)
+    print(f"{len(syns)} sinónimos escritos en {SYNONYMS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
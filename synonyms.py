@@ -1,5 +1,8 @@
-from typing import List
-from deep_translator import GoogleTranslator
+import json
+from pathlib import Path
+from typing import List, Optional
+
+SYNONYMS_FILE = Path(__file__).with_name("synonyms.json")
 
 # 1) Define tu lista base en español (o en tu idioma principal)
 BASE_SYNONYMS = [
@@ -29,6 +32,8 @@ TARGET_LANGS = [
 ]
 
 def build_query_synonyms(base_list: List[str], target_codes: List[str]) -> List[str]:
+    from deep_translator import GoogleTranslator
+
     all_syns = set()
     for term in base_list:
         all_syns.add(term.strip().lower())
@@ -42,5 +47,19 @@ def build_query_synonyms(base_list: List[str], target_codes: List[str]) -> List[
     # Devolver como lista ordenada (opcional)
     return sorted(all_syns)
 
-# Generar la lista definitiva al importarse el módulo
-QUERY_SYNONYMS = build_query_synonyms(BASE_SYNONYMS, TARGET_LANGS)
+_query_synonyms: Optional[List[str]] = None
+
+
+def __getattr__(name: str):
+    # QUERY_SYNONYMS se carga al primer acceso, no al importar el módulo:
+    # desde synonyms.json (scripts/build_synonyms.py) o, si no existe, solo la lista
+    # base. Nunca se traduce en tiempo de ejecución.
+    global _query_synonyms
+    if name != "QUERY_SYNONYMS":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _query_synonyms is None:
+        if SYNONYMS_FILE.exists():
+            _query_synonyms = json.loads(SYNONYMS_FILE.read_text(encoding="utf-8"))
+        else:
+            _query_synonyms = list(BASE_SYNONYMS)
+    return _query_synonyms